@@ -6,10 +6,17 @@
 
 from .fs import mbr, gpt, fat, ext
 from .image import LinuxImage
-from .smxfile import SmxFile
 
 __author__  = "Martin Olejar"
 __contact__ = "martin.olejar@gmail.com"
 __version__ = "0.0.1"
 __license__ = "BSD 3"
 __status__  = "Development"
+
+
+def __getattr__(name):
+    # SMX support (YAML, Jinja2 and the data segments stack) is imported on first use only
+    if name == 'SmxFile':
+        from .smxfile import SmxFile
+        return SmxFile
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
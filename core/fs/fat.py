@@ -5,8 +5,10 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 import os
+import sys
 from zlib import crc32
 from datetime import datetime, date, time
+from threading import Lock
 from io import BufferedReader, FileIO, BytesIO, SEEK_CUR, SEEK_END
 from struct import pack, unpack_from, calcsize
 from easy_enum import EEnum as Enum
@@ -684,6 +686,7 @@ class FAT(object):
     RESERVED = {12: 0x0FF7, 16: 0xFFF7, 32: 0x0FFFFFF7}
     BAD_MARK = {12: 0x0FF7, 16: 0xFFF7, 32: 0x0FFFFFF7}
     EOF_MARK = {12: 0x0FF8, 16: 0xFFF8, 32: 0x0FFFFFF8}
+    READ_CHUNK_SIZE = 1 << 30
 
     def __init__(self, stream, offset, sectors, bits=32):
         """
@@ -706,6 +709,16 @@ class FAT(object):
         self.fs_info = None
         self.fat_blob = None
         self.root_dir = None
+        # file descriptor for seek-free reads, otherwise the stream access is serialized by lock
+        self._io_lock = Lock()
+        self._io_fd = None
+        # only raw file or read-only buffered raw file, wrappers like GzipFile return fd with different offsets
+        raw = stream.raw if isinstance(stream, BufferedReader) else stream
+        if hasattr(os, 'pread') and isinstance(raw, FileIO):
+            try:
+                self._io_fd = stream.fileno()
+            except OSError:
+                pass
         # ...
         self.load()
 
@@ -721,6 +734,25 @@ class FAT(object):
         cluster = cluster - 2
         return self._io_offset + self.boot_sector.data_offset + cluster * self.boot_sector.cluster_size
 
+    def _read_data(self, offset, size):
+        """ Thread safe read of data from absolute offset in the stream, short reads are continued """
+        chunks = []
+        while size > 0:
+            # single read is limited by OS (~2 GiB on Linux), so read the large data in bounded chunks
+            chunk_size = min(size, self.READ_CHUNK_SIZE)
+            if self._io_fd is not None:
+                chunk = os.pread(self._io_fd, chunk_size, offset)
+            else:
+                with self._io_lock:
+                    self._io.seek(offset)
+                    chunk = self._io.read(chunk_size)
+            if not chunk:
+                raise FATError("Unexpected end of image at offset 0x{:X}".format(offset))
+            chunks.append(chunk)
+            offset += len(chunk)
+            size -= len(chunk)
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
     def _get_file_clusters(self, first_cluster):
         clusters = [first_cluster]
         fat_index = first_cluster
@@ -739,12 +771,12 @@ class FAT(object):
                     value |= (self.fat_blob[blob_index + 1] & 0x0F) << 8
 
             elif self.bits == 16:
-                value = unpack_from('<H', self.fat_blob, fat_index * 2)
+                value = unpack_from('<H', self.fat_blob, fat_index * 2)[0]
 
             else:
-                value = unpack_from('<I', self.fat_blob, fat_index * 4)
+                value = unpack_from('<I', self.fat_blob, fat_index * 4)[0] & 0x0FFFFFFF
 
-            if value == self.eof_mark:
+            if value >= self.eof_mark:
                 break
 
             clusters.append(value)
@@ -752,6 +784,27 @@ class FAT(object):
 
         return clusters
 
+    def _get_file_runs(self, file_entry):
+        """ Get file data location as list of [offset, size] items, contiguous clusters are merged into one item """
+        runs = []
+        file_size = file_entry.file_size
+        cluster_size = self.boot_sector.cluster_size
+        cluster_offset = self._get_data_cluster_offset
+
+        for cluster in self._get_file_clusters(file_entry.first_cluster):
+            if file_size == 0:
+                break
+            # calculate cluster offset and data size
+            offset = cluster_offset(cluster)
+            size = cluster_size if cluster_size < file_size else file_size
+            if runs and runs[-1][0] + runs[-1][1] == offset:
+                runs[-1][1] += size
+            else:
+                runs.append([offset, size])
+            file_size -= size
+
+        return runs
+
     def info(self):
         nfo = str()
         nfo += " < FAT: Boot Sector > " + "-" * 39 + "\n"
@@ -805,22 +858,7 @@ class FAT(object):
         else:
             raise FATError()
 
-        file_data = b''
-        file_size = file_entry.file_size
-        file_clusters = self._get_file_clusters(file_entry.first_cluster)
-
-        for cluster in file_clusters:
-            if file_size == 0:
-                break
-            # calculate cluster offset and data size
-            offset = self._get_data_cluster_offset(cluster)
-            size = min(self.boot_sector.cluster_size, file_size)
-            # read data from cluster
-            self._io.seek(offset)
-            file_data += self._io.read(size)
-            file_size -= size
-
-        return file_data
+        return b''.join(self._read_data(offset, size) for offset, size in self._get_file_runs(file_entry))
 
     def save_file(self, name_or_entry, dest_path=''):
         if isinstance(name_or_entry, str):
@@ -832,22 +870,35 @@ class FAT(object):
         else:
             raise FATError()
 
-        file_size = file_entry.file_size
         file_path = os.path.join(dest_path, file_entry.name)
-        file_clusters = self._get_file_clusters(file_entry.first_cluster)
+        file_runs = self._get_file_runs(file_entry)
 
         with open(file_path, "wb") as f:
-            for cluster in file_clusters:
-                # break if no more date
-                if file_size == 0:
-                    break
-                # calculate cluster offset and data size
-                offset = self._get_data_cluster_offset(cluster)
-                size = min(self.boot_sector.cluster_size,  file_size)
-                # copy data from cluster
-                self._io.seek(offset)
-                f.write(self._io.read(size))
-                file_size -= size
+            if self._io_fd is not None and sys.platform.startswith('linux'):
+                # copy data inside the kernel, without passing it through python buffers
+                out_fd = f.fileno()
+                for offset, size in file_runs:
+                    while size > 0:
+                        sent = os.sendfile(out_fd, self._io_fd, offset, size)
+                        if sent == 0:
+                            raise FATError("Unexpected end of image while saving \"{}\"".format(file_entry.name))
+                        offset += sent
+                        size -= sent
+            else:
+                for offset, size in file_runs:
+                    f.write(self._read_data(offset, size))
+
+    def save_all(self, dest_path='', workers=None):
+        """ Save all files from root directory concurrently
+        :param dest_path: Destination directory path
+        :param workers: The max number of worker threads (default: os.cpu_count())
+        """
+        # imported on first use, it's not needed for other FAT operations
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            # consume results for propagating the exceptions from worker threads
+            list(executor.map(lambda file_entry: self.save_file(file_entry, dest_path), self.root_dir))
 
     def import_file(self, file_name, data):
         assert isinstance(file_name, str)
@@ -90,6 +90,10 @@ class GPTError(Exception):
 
 class Header(object):
 
+    __slots__ = ('revision', 'current_lba', 'backup_lba', 'first_usable_lba', 'last_usable_lba', 'disk_guid',
+                 'partition_entry_lba', 'number_of_partition_entries', 'size_of_partition_entry',
+                 'partition_entry_array_crc32')
+
     SIGNATURE = b'EFI PART'
     FORMAT = '<8s4s3I4Q16sQ3I'
     SIZE = calcsize(FORMAT)
@@ -145,18 +149,18 @@ class Header(object):
         return not self.__eq__(obj)
 
     def info(self):
-        nfo = str()
-        nfo += " Revision:         {}.{}\n".format(self.revision[2], self.revision[3])
-        nfo += " Current LBA:      {}\n".format(self.current_lba)
-        nfo += " Backup LBA:       {}\n".format(self.backup_lba)
-        nfo += " First Usable LBA: {}\n".format(self.first_usable_lba)
-        nfo += " Last Usable LBA:  {}\n".format(self.last_usable_lba)
-        nfo += " Disk GUID:        {}\n".format(self.disk_guid)
-        nfo += " Entries Count:    {}\n".format(self.number_of_partition_entries)
-        nfo += " Part. Entry LBA:  {}\n".format(self.last_usable_lba)
-        nfo += " Part. Entry Size: {}\n".format(self.size_of_partition_entry)
-        nfo += " Part. Entry CRC:  0x{:X}\n".format(self.partition_entry_array_crc32)
-        return nfo
+        return "".join([
+            " Revision:         {}.{}\n".format(self.revision[2], self.revision[3]),
+            " Current LBA:      {}\n".format(self.current_lba),
+            " Backup LBA:       {}\n".format(self.backup_lba),
+            " First Usable LBA: {}\n".format(self.first_usable_lba),
+            " Last Usable LBA:  {}\n".format(self.last_usable_lba),
+            " Disk GUID:        {}\n".format(self.disk_guid),
+            " Entries Count:    {}\n".format(self.number_of_partition_entries),
+            " Part. Entry LBA:  {}\n".format(self.partition_entry_lba),
+            " Part. Entry Size: {}\n".format(self.size_of_partition_entry),
+            " Part. Entry CRC:  0x{:X}\n".format(self.partition_entry_array_crc32)
+        ])
 
     def export(self):
         return pack(self.FORMAT,
@@ -177,7 +181,7 @@ class Header(object):
 
     @classmethod
     def parse(cls, data, offset=0):
-        if len(data) <= offset + cls.SIZE:
+        if len(data) < offset + cls.SIZE:
             raise Exception()
         obj = cls()
         (
@@ -208,6 +212,8 @@ class Header(object):
 
 class PartitionEntry(object):
 
+    __slots__ = ('partition_name', 'partition_type', 'partition_guid', 'first_lba', 'last_lba', 'attribute_flags')
+
     FORMAT = '<16s16sQQQ72s'
     SIZE = calcsize(FORMAT)
 
@@ -235,14 +241,14 @@ class PartitionEntry(object):
         return not self.__eq__(obj)
 
     def info(self):
-        nfo = str()
-        nfo += " Part. Name:   {}\n".format(self.partition_name)
-        nfo += " Part. Type:   {}\n".format(PART_DESC.get(str(self.partition_type), str(self.partition_type)))
-        nfo += " Part. GUID:   {}\n".format(self.partition_guid)
-        nfo += " First LBA:    {}\n".format(self.first_lba)
-        nfo += " Last  LBA:    {}\n".format(self.last_lba)
-        nfo += " Attr. Flags:  0x{:X}\n".format(self.attribute_flags)
-        return nfo
+        return "".join([
+            " Part. Name:   {}\n".format(self.partition_name),
+            " Part. Type:   {}\n".format(PART_DESC.get(str(self.partition_type), str(self.partition_type))),
+            " Part. GUID:   {}\n".format(self.partition_guid),
+            " First LBA:    {}\n".format(self.first_lba),
+            " Last  LBA:    {}\n".format(self.last_lba),
+            " Attr. Flags:  0x{:X}\n".format(self.attribute_flags)
+        ])
 
     def export(self):
         return pack(self.FORMAT,
@@ -255,7 +261,7 @@ class PartitionEntry(object):
 
     @classmethod
     def parse(cls, data, offset=0):
-        if len(data) <= offset + cls.SIZE:
+        if len(data) < offset + cls.SIZE:
             raise Exception()
         obj = cls()
         (
@@ -275,36 +281,35 @@ class PartitionEntry(object):
 class GPT(object):
     """ GUID Partition Table (GPT) """
 
+    __slots__ = ('header', 'sector_size', '_partitions')
+
     MAX_PARTITIONS = 128
-    SIZE = 0
+    # header sector + partition entries array (for 512 bytes sector)
+    SIZE = 512 + MAX_PARTITIONS * 128
 
     def __init__(self, header):
         self.header = header
         self.sector_size = 512
-        self._partitions = {}
+        self._partitions = [None] * self.MAX_PARTITIONS
 
     def __eq__(self, obj):
         if not isinstance(obj, GPT):
             return False
-        if self.header != obj.header or self.sector_size != obj.sector_size:
+        if self.sector_size != obj.sector_size or self.header != obj.header:
             return False
-        if len(self._partitions) != len(obj):
-            return False
-        for index, part in self._partitions.items():
-            if part != obj[index]:
-                return False
-        return True
+        # fixed-size lists, empty slots are None
+        return self._partitions == obj._partitions
 
     def __ne__(self, obj):
         return not self.__eq__(obj)
 
     def __len__(self):
-        return len(self._partitions)
+        return self.MAX_PARTITIONS - self._partitions.count(None)
 
     def __getitem__(self, key):
         if key >= self.MAX_PARTITIONS:
             raise IndexError()
-        return self._partitions.get(key)
+        return self._partitions[key]
 
     def __setitem__(self, key, value):
         assert isinstance(value, PartitionEntry)
@@ -313,41 +318,40 @@ class GPT(object):
         self._partitions[key] = value
 
     def __iter__(self):
-        return iter(self._partitions.values())
+        return (partition for partition in self._partitions if partition is not None)
 
     def clear(self):
-        self._partitions.clear()
+        self._partitions = [None] * self.MAX_PARTITIONS
 
     def dell(self, index):
-        return self._partitions.pop(index)
+        partition = self._partitions[index]
+        self._partitions[index] = None
+        return partition
 
     def info(self):
-        nfo = str()
-        nfo += " < GPT Header > " + "-" * 45 + "\n"
-        nfo += self.header.info()
-        nfo += " " + "-" * 60 + "\n\n"
-        for i, partition in self._partitions.items():
-            if partition.first_lba != 0 and partition.last_lba != 0:
-                nfo += " < GPT Partition {:3d} > ".format(i)
-                nfo += "-" * 38 + "\n"
-                nfo += partition.info()
-                nfo += " " + "-" * 60 + "\n\n"
-        return nfo
+        nfo = [" < GPT Header > " + "-" * 45 + "\n", self.header.info(), " " + "-" * 60 + "\n\n"]
+        for i, partition in enumerate(self._partitions):
+            if partition is not None and partition.first_lba != 0 and partition.last_lba != 0:
+                nfo.append(" < GPT Partition {:3d} > ".format(i) + "-" * 38 + "\n")
+                nfo.append(partition.info())
+                nfo.append(" " + "-" * 60 + "\n\n")
+        return "".join(nfo)
 
     def export(self):
         # TODO: Update header
-        data = self.header.export()
-        data += bytes([0] * (self.sector_size - self.header.SIZE))
-        for i in range(self.MAX_PARTITIONS):
-            data += bytes([0] * PartitionEntry.SIZE) if self._partitions[i] is None else self._partitions[i].export()
-        return data
+        empty_entry = bytes(PartitionEntry.SIZE)
+        data = [self.header.export(), bytes(self.sector_size - self.header.SIZE)]
+        data += [empty_entry if partition is None else partition.export() for partition in self._partitions]
+        return b''.join(data)
 
     @classmethod
     def parse(cls, data, offset=0, sector_size=512):
         gpt = cls(Header.parse(data, offset))
+        parse_entry = PartitionEntry.parse
+        entry_size = PartitionEntry.SIZE
+        offset += sector_size
         for i in range(gpt.header.number_of_partition_entries):
-            pentry = PartitionEntry.parse(data, offset + sector_size)
-            offset += PartitionEntry.SIZE
+            pentry = parse_entry(data, offset + i * entry_size)
             if pentry.first_lba != 0 and pentry.last_lba != 0:
                 gpt[i] = pentry
         return gpt
@@ -5,8 +5,14 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 
-from struct import pack, unpack_from, calcsize
-from easy_enum import EEnum as Enum
+from enum import IntEnum
+from struct import Struct
+
+
+_PE_STRUCT = Struct('<8BLL')
+_PT_STRUCT = Struct('<' + '8BLL' * 4)
+_SIG_STRUCT = Struct('<H')
+_BYTES_T = (bytes, bytearray, memoryview)
 
 
 ########################################################################################################################
@@ -21,9 +27,15 @@ class MBRError(Exception):
 # MBR Enums
 ########################################################################################################################
 
-class PartitionType(Enum):
+class PartitionType(IntEnum):
     """ MBR Partition Type """
 
+    def __new__(cls, value, label):
+        obj = int.__new__(cls, value)
+        obj._value_ = value
+        obj.label = label
+        return obj
+
     EMPTY = (0x00, 'Empty')
     FAT12 = (0x01, 'FAT12')
     FAT16_32M = (0x04, 'FAT16 16-32MB')
@@ -81,6 +93,11 @@ class PartitionType(Enum):
     LINUX_RAID = (0xFD, 'Linux RAID')
 
 
+# Partition type lookup tables: value -> label and 256-bit mask of valid values
+_PT_LABEL = {item.value: item.label for item in PartitionType}
+_PT_VALID_MASK = sum(1 << value for value in PartitionType._value2member_map_)
+
+
 ########################################################################################################################
 # MBR Classes
 ########################################################################################################################
@@ -88,8 +105,11 @@ class PartitionType(Enum):
 class PartitionEntry(object):
     """ MBR Partition Entry """
 
-    FORMAT = '<8BLL'
-    SIZE = calcsize(FORMAT)
+    __slots__ = ('_status', '_partition_type', 'start_head', 'start_sector', 'start_cylinder',
+                 'end_head', 'end_sector', 'end_cylinder', 'lba_start', 'num_sectors')
+
+    FORMAT = _PE_STRUCT.format
+    SIZE = _PE_STRUCT.size
 
     @property
     def bootable(self):
@@ -106,7 +126,7 @@ class PartitionEntry(object):
 
     @partition_type.setter
     def partition_type(self, value):
-        assert PartitionType.is_valid(value)
+        assert 0 <= value <= 0xFF and (_PT_VALID_MASK >> value) & 1
         self._partition_type = value
 
     def __init__(self, status=0, partition_type=0):
@@ -145,34 +165,43 @@ class PartitionEntry(object):
 
     def info(self):
         """ Return Partition-Entry info """
-        nfo = str()
-        nfo += " Bootable:       {}\n".format('YES' if self.bootable else 'NO')
-        nfo += " Partition Type: {}\n".format(PartitionType[self.partition_type])
-        nfo += " CHS Start:      {} Head, {} Sector, {} Cylinder\n".format(self.start_head,
-                                                                           self.start_sector,
-                                                                           self.start_cylinder)
-        nfo += " CHS End:        {} Head, {} Sector, {} Cylinder\n".format(self.end_head,
-                                                                           self.end_sector,
-                                                                           self.end_cylinder)
-        nfo += " LBA Start:      {}\n".format(self.lba_start)
-        nfo += " Sectors Count:  {}\n".format(self.num_sectors)
-        return nfo
+        return "".join([
+            " Bootable:       {}\n".format('YES' if self.bootable else 'NO'),
+            " Partition Type: {}\n".format(_PT_LABEL.get(self.partition_type, '0x{:02X}'.format(self.partition_type))),
+            " CHS Start:      {} Head, {} Sector, {} Cylinder\n".format(self.start_head,
+                                                                        self.start_sector,
+                                                                        self.start_cylinder),
+            " CHS End:        {} Head, {} Sector, {} Cylinder\n".format(self.end_head,
+                                                                        self.end_sector,
+                                                                        self.end_cylinder),
+            " LBA Start:      {}\n".format(self.lba_start),
+            " Sectors Count:  {}\n".format(self.num_sectors)
+        ])
+
+    def _raw_fields(self):
+        return (self._status,
+                self.start_head,
+                (self.start_sector & 0x3F) | ((self.start_cylinder >> 2) & 0xC0),
+                self.start_cylinder & 0xFF,
+                self._partition_type,
+                self.end_head,
+                (self.end_sector & 0x3F) | ((self.end_cylinder >> 2) & 0xC0),
+                self.end_cylinder & 0xFF,
+                self.lba_start,
+                self.num_sectors)
 
     def export(self):
         """ Export Partition-Entry as bytes array
         :return type: bytes
         """
-        return pack(self.FORMAT,
-                    self._status,
-                    self.start_head,
-                    (self.start_sector & 0x3F) | ((self.start_cylinder >> 2) & 0xC0),
-                    self.start_cylinder & 0xFF,
-                    self._partition_type,
-                    self.end_head,
-                    (self.end_sector & 0x3F) | ((self.end_cylinder >> 2) & 0xC0),
-                    self.end_cylinder & 0xFF,
-                    self.lba_start,
-                    self.num_sectors)
+        return _PE_STRUCT.pack(*self._raw_fields())
+
+    def export_into(self, buffer, offset=0):
+        """ Export Partition-Entry directly into writable buffer
+        :param buffer: The bytearray or memoryview object
+        :param offset: The offset in buffer
+        """
+        _PE_STRUCT.pack_into(buffer, offset, *self._raw_fields())
 
     @classmethod
     def parse(cls, data, offset=0):
@@ -181,9 +210,17 @@ class PartitionEntry(object):
         :param offset: The offset in bytes array
         :return: PartitionEntry object
         """
+        return cls.from_row(_PE_STRUCT.unpack_from(data, offset))
+
+    @classmethod
+    def from_row(cls, row):
+        """ Create Partition-Entry from raw partition table row
+        :param row: The tuple of raw fields (see MBR.parse_table)
+        :return: PartitionEntry object
+        """
         (
             status, start_head, start_sc, start_cs, partition_type, end_head, end_sc, end_cs, lba_start, num_sectors
-        ) = unpack_from(cls.FORMAT, data, offset)
+        ) = row
         obj = cls(status, partition_type)
         obj.start_head = start_head
         obj.start_sector = start_sc & 0x3F
@@ -199,6 +236,8 @@ class PartitionEntry(object):
 class MBR(object):
     """ The Master Boot Record (MBR) Class """
 
+    __slots__ = ('_bootstrap', '_partitions')
+
     BOOTSTRAP_SIZE = 446
     MAX_PARTITIONS = 4
     SIGNATURE = 0xAA55
@@ -210,12 +249,12 @@ class MBR(object):
 
     @bootstrap.setter
     def bootstrap(self, value):
-        assert isinstance(value, (bytes, bytearray))
+        assert isinstance(value, _BYTES_T)
         self._bootstrap = bytearray(value)
 
     def __init__(self, bootstrap=None):
         self._bootstrap = bytearray(self.BOOTSTRAP_SIZE)
-        self._partitions = {}
+        self._partitions = [None] * self.MAX_PARTITIONS
         if bootstrap is not None:
             self.bootstrap = bootstrap
 
@@ -224,23 +263,18 @@ class MBR(object):
             return False
         if self.bootstrap != obj.bootstrap:
             return False
-        if len(self._partitions) != len(obj):
-            return False
-        for index, part in self._partitions.items():
-            if part != obj[index]:
-                return False
-        return True
+        return self._partitions == obj._partitions
 
     def __ne__(self, obj):
         return not self.__eq__(obj)
 
     def __len__(self):
-        return len(self._partitions)
+        return self.MAX_PARTITIONS - self._partitions.count(None)
 
     def __getitem__(self, key):
         if key >= self.MAX_PARTITIONS:
             raise IndexError("index out of range: {} > max({})".format(key, self.MAX_PARTITIONS - 1))
-        return self._partitions.get(key)
+        return self._partitions[key]
 
     def __setitem__(self, key, value):
         assert isinstance(value, PartitionEntry)
@@ -249,38 +283,44 @@ class MBR(object):
         self._partitions[key] = value
 
     def __iter__(self):
-        return iter(self._partitions.values())
+        return (partition for partition in self._partitions if partition is not None)
 
     def clear(self):
         """ Remove all partitions entry """
-        self._partitions.clear()
+        self._partitions = [None] * self.MAX_PARTITIONS
 
     def dell(self, index):
         """ Remove selected partition entry
         :param index: partitions entry index
         :return removed object
         """
-        return self._partitions.pop(index)
+        partition = self._partitions[index]
+        self._partitions[index] = None
+        return partition
 
     def info(self):
         """ Return MBR info """
-        nfo = str()
-        for i, partition in self._partitions.items():
-            nfo += " < MBR: Partition {} > ".format(i)
-            nfo += "-" * 39 + "\n"
-            nfo += partition.info()
-            nfo += " " + "-" * 60 + "\n\n"
-        return nfo
+        nfo = []
+        for i, partition in enumerate(self._partitions):
+            if partition is None:
+                continue
+            nfo.append(" < MBR: Partition {} > ".format(i) + "-" * 39 + "\n")
+            nfo.append(partition.info())
+            nfo.append(" " + "-" * 60 + "\n\n")
+        return "".join(nfo)
 
     def export(self):
         """ Export MBR as bytes array
         :return type: bytes
         """
-        data = bytes(self.bootstrap)
-        for i in range(self.MAX_PARTITIONS):
-            data += bytes([0]*PartitionEntry.SIZE) if self._partitions.get(i) is None else self._partitions[i].export()
-        data += pack("<H", self.SIGNATURE)
-        return data
+        data = bytearray(self.SIZE)
+        bootstrap = self._bootstrap[:self.BOOTSTRAP_SIZE]
+        data[:len(bootstrap)] = bootstrap
+        for i, partition in enumerate(self._partitions):
+            if partition is not None:
+                partition.export_into(data, self.BOOTSTRAP_SIZE + i * PartitionEntry.SIZE)
+        _SIG_STRUCT.pack_into(data, self.SIZE - 2, self.SIGNATURE)
+        return bytes(data)
 
     @classmethod
     def parse(cls, data, offset=0):
@@ -291,14 +331,25 @@ class MBR(object):
         """
         if len(data) < (offset + cls.SIZE):
             raise MBRError()
-        if unpack_from("<H", data, offset + (cls.SIZE - 2))[0] != cls.SIGNATURE:
+        # signature 0xAA55 stored as little-endian bytes 0x55, 0xAA
+        if data[offset + cls.SIZE - 2] != 0x55 or data[offset + cls.SIZE - 1] != 0xAA:
             raise MBRError()
 
+        data = memoryview(data)
         mbr = cls(data[offset:offset+cls.BOOTSTRAP_SIZE])
-        offset += cls.BOOTSTRAP_SIZE
-        for i in range(cls.MAX_PARTITIONS):
-            partition = PartitionEntry.parse(data, offset)
-            offset += PartitionEntry.SIZE
-            if partition.partition_type != PartitionType.EMPTY:
-                mbr[i] = partition
+        for i, row in enumerate(cls.parse_table(data, offset)):
+            # skip empty slots without constructing the entry, the slot index is always valid here
+            if row[4] != PartitionType.EMPTY:
+                mbr._partitions[i] = PartitionEntry.from_row(row)
         return mbr
+
+    @classmethod
+    def parse_table(cls, data, offset=0):
+        """ Parse MBR partition table as raw rows, without creating PartitionEntry objects
+        :param data: The bytes array
+        :param offset: The offset of MBR in bytes array
+        :return: tuple of 4 rows: (status, start_head, start_sector, start_cylinder, partition_type, end_head,
+                 end_sector, end_cylinder, lba_start, num_sectors) with CHS fields in packed on-disk form
+        """
+        fields = _PT_STRUCT.unpack_from(data, offset + cls.BOOTSTRAP_SIZE)
+        return tuple(fields[i:i + 10] for i in range(0, len(fields), 10))
@@ -5,6 +5,8 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 import os
+from zlib import crc32
+from struct import unpack_from
 from io import FileIO, BytesIO, BufferedReader, SEEK_CUR, SEEK_END
 from imx import img
 from uboot import env_blob
@@ -37,6 +39,13 @@ class ImageBase(object):
         raise NotImplementedError()
 
     def size(self):
+        # size of the file only for raw or read-only buffered raw file, wrappers like GzipFile return fd of other data
+        raw = self._io.raw if isinstance(self._io, BufferedReader) else self._io
+        if isinstance(raw, FileIO):
+            try:
+                return os.fstat(raw.fileno()).st_size
+            except OSError:
+                pass
         cur_pos = self._io.tell()
         end_pos = self._io.seek(0, SEEK_END)
         self._io.seek(cur_pos)
@@ -85,18 +94,7 @@ class LinuxImage(ImageBase):
 
     def info(self):
         """ Linux image info """
-        nfo = str()
-        if self.mbr:
-            nfo += self.mbr.info()
-        if self.spl:
-            nfo += self.spl.info()
-        if self.env:
-            nfo += self.env.info()
-        if self.fat:
-            nfo += self.fat.info()
-        if self.ext:
-            nfo += self.ext.info()
-        return nfo
+        return "".join(item.info() for item in (self.mbr, self.spl, self.env, self.fat, self.ext) if item)
 
     def parse(self, spl_offset=None, env_offset=None):
         """ Parse boot image
@@ -108,9 +106,7 @@ class LinuxImage(ImageBase):
             raise Exception()
 
         # Get actual partition offset
-        part_offset = 0x800000
-        for p in self.mbr:
-            part_offset = min(p.lba_start * 512, part_offset)
+        part_offset = min(min(p.lba_start for p in self.mbr) * 512, 0x800000)
 
         # Validate and use SPL offset
         if spl_offset is not None:
@@ -129,13 +125,22 @@ class LinuxImage(ImageBase):
         # Parse U-Boot ENV
         if env_offset is None:
             env_offset = self._io.tell()
-            while env_offset < (part_offset - self.ENV_MAX_SIZE):
+            # read the whole searched region at once and scan it in memory
+            region = self._io.read(max(part_offset - env_offset, 0))
+            view = memoryview(region)
+            for pos in range(0, len(region) - self.ENV_MAX_SIZE, self.ENV_MAX_SIZE):
+                end = pos + self.ENV_MAX_SIZE
+                # probe the CRC header before full parsing, flag 0x01 after CRC marks redundant env (as EnvBlob)
+                crc, flag = unpack_from('<IB', region, pos)
+                if crc != crc32(view[pos + (5 if flag == 0x01 else 4):end]):
+                    continue
                 try:
-                    self.env = env_blob.EnvBlob.parse(self._io.read(self.ENV_MAX_SIZE))
+                    self.env = env_blob.EnvBlob.parse(region[pos:end])
+                    env_offset += pos
                     break
-                except:
-                    env_offset += self.ENV_MAX_SIZE
-                    self._io.seek(env_offset)
+                except ValueError:
+                    # valid CRC, but not decodable or malformed variables
+                    pass
         else:
             self._io.seek(env_offset)
             self.env = env_blob.EnvBlob.parse(self._io.read(self.ENV_MAX_SIZE))
@@ -145,22 +150,25 @@ class LinuxImage(ImageBase):
             self.env_offset = env_offset
 
         # Parse FAT and EXT2/3/4 partitions
-        if self.mbr[0].partition_type in self.FAT_PARTITIONS:
+        part = self.mbr[0]
+        offset = part.lba_start * 512
+        fat_bits = self.FAT_PARTITIONS.get(part.partition_type)
+        if fat_bits is not None:
             try:
-                self.fat = fat.FAT(self._io, self.mbr[0].lba_start * 512, self.mbr[0].num_sectors,
-                                   self.FAT_PARTITIONS[self.mbr[0].partition_type])
+                self.fat = fat.FAT(self._io, offset, part.num_sectors, fat_bits)
             except:
-                fat_bits = fat.get_fat_bits(self._io, self.mbr[0].lba_start * 512)
-                self.fat = fat.FAT(self._io, self.mbr[0].lba_start * 512, self.mbr[0].num_sectors, fat_bits)
+                fat_bits = fat.get_fat_bits(self._io, offset)
+                self.fat = fat.FAT(self._io, offset, part.num_sectors, fat_bits)
 
-        elif self.mbr[0].partition_type == mbr.PartitionType.LINUX:
-            self.ext = ext.ExtX(self._io, self.mbr[0].lba_start * 512, self.mbr[0].num_sectors * 512)
+        elif part.partition_type == mbr.PartitionType.LINUX:
+            self.ext = ext.ExtX(self._io, offset, part.num_sectors * 512)
         else:
             pass
 
         if len(self.mbr) > 1 and self.ext is None:
-            if self.mbr[1].partition_type == mbr.PartitionType.LINUX:
-                self.ext = ext.ExtX(self._io, self.mbr[1].lba_start * 512, self.mbr[1].num_sectors * 512)
+            part = self.mbr[1]
+            if part.partition_type == mbr.PartitionType.LINUX:
+                self.ext = ext.ExtX(self._io, part.lba_start * 512, part.num_sectors * 512)
 
     def extract(self, dest_path):
         """ Extract image content
@@ -181,9 +189,7 @@ class LinuxImage(ImageBase):
         if self.fat:
             fat_dir = os.path.join(dest_path, 'fat')
             os.makedirs(fat_dir, exist_ok=True)
-
-            for file in self.fat.root_dir:
-                self.fat.save_file(file, fat_dir)
+            self.fat.save_all(fat_dir)
 
         if self.ext:
             self.ext.save_as(os.path.join(dest_path, 'rootfs.img'))
@@ -206,10 +212,11 @@ class AndroidImage(ImageBase):
             self.parse()
 
     def parse(self):
-        self.mbr = mbr.MBR.parse(self._io.read(mbr.MBR.SIZE))
+        data = memoryview(self._io.read(mbr.MBR.SIZE + gpt.GPT.SIZE))
+        self.mbr = mbr.MBR.parse(data)
         if self.mbr[0].partition_type != mbr.PartitionType.EFI_GPT_PROTECT_MBR:
             raise Exception()
-        self.gpt = gpt.GPT.parse(self._io.read(gpt.GPT.SIZE))
+        self.gpt = gpt.GPT.parse(data, mbr.MBR.SIZE)
 
     def update(self):
         pass
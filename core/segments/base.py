@@ -5,44 +5,108 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 import os
+import sys
+from pathlib import Path
+from functools import lru_cache
 from voluptuous import Schema, ALLOW_EXTRA
 
 
+def parse_int(value):
+    """ Validate integer value given as int or as string with base prefix ('0x10', '0b1', '16')
+    :param value: The input value
+    :return: int
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return int(value, 0)
+    raise ValueError("not a valid value")
+
+
+@lru_cache(maxsize=None)
+def _resolve_path(root, path):
+    """ Resolve one path, only existing paths are cached
+    :param root:
+    :param path:
+    :return:
+    """
+    if os.path.isabs(path):
+        candidates = (path,)
+    else:
+        # relative to root (expected case) and as given
+        candidates = (os.path.join(root, path), path)
+
+    for abs_path in candidates:
+        abs_path = os.path.normpath(abs_path)
+        if os.path.exists(abs_path):
+            return abs_path
+
+    raise Exception("Path: \"%s\" doesnt exist" % path)
+
+
 def get_full_path(root, *path_list):
     """
     :param root:
     :param path:
     :return:
     """
-    ret_path = []
-    for path in path_list:
-        file_path = ""
-        for abs_path in [path, os.path.join(root, path)]:
-            abs_path = os.path.normpath(abs_path)
-            if os.path.exists(abs_path):
-                file_path = abs_path
-                break
-        if not file_path:
-            raise Exception("Path: \"%s\" doesnt exist" % path)
-        ret_path.append(file_path)
+    return [_resolve_path(root, path) for path in path_list]
+
+
+def read_file(path):
+    """ Read whole file content
+    :param path: The path to file
+    :return: bytes
+    """
+    return Path(path).read_bytes()
 
-    return ret_path
+
+def read_text(path, read_fn=read_file):
+    """ Read whole text file content with universal newlines (as text mode reading does)
+    :param path: The path to file
+    :param read_fn: The file content reader
+    :return: str
+    """
+    text = read_fn(path).decode()
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+class FileCache(object):
+    """ Read-through cache of files content, shared by data segments which use the same source files """
+
+    def __init__(self):
+        self._files = {}
+
+    def __call__(self, path):
+        """ Read whole file content, every file is read only once
+        :param path: The path to file
+        :return: bytes
+        """
+        key = os.fspath(path)
+        data = self._files.get(key)
+        if data is None:
+            data = self._files.setdefault(key, read_file(key))
+        return data
+
+    def clear(self):
+        self._files.clear()
 
 
 def get_data_segment(db, name):
     """ Get data segments by it's name
-    :param db:
+    :param db: The data segments index: {index_key: object}
     :param name: The name of data segments
     :return: return object
     """
-    assert isinstance(db, list), ""
+    assert isinstance(db, dict), ""
     assert isinstance(name, str), ""
 
-    for item in db:
-        if item.full_name == name.upper():
-            return item
-
-    raise Exception("{} doesn't exist !".format(name))
+    try:
+        return db[sys.intern(name.upper())]
+    except KeyError:
+        raise Exception("{} doesn't exist !".format(name))
 
 
 class DatSegBase(object):
@@ -51,13 +115,30 @@ class DatSegBase(object):
     MARK = 'base'
     SCHEMA = {}
 
+    # compiled validator, built once per class from SCHEMA
+    _schema = Schema(SCHEMA, extra=ALLOW_EXTRA)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # classes with own validation (more schemas selected in init) don't define SCHEMA
+        if 'SCHEMA' in cls.__dict__:
+            cls._schema = Schema(cls.SCHEMA, extra=ALLOW_EXTRA)
+
     @property
     def loaded(self):
         return False if self.smx_data is None else True
 
     @property
-    def full_name(self):
-        return '{}.{}'.format(self.name, self.MARK)
+    def data(self):
+        # file backed content is read only when it's really needed
+        if self._data is None and self._data_path is not None:
+            self._data = Path(self._data_path).read_bytes()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._data_path = None
 
     def __init__(self, name, smx_data=None):
         """ Init BaseItem
@@ -67,7 +148,11 @@ class DatSegBase(object):
         assert isinstance(name, str)
 
         self.name = name
-        self.data = None
+        self.full_name = '{}.{}'.format(name, self.MARK)
+        # case insensitive lookup key of data segments index (interned for fast dict compare)
+        self.index_key = sys.intern(self.full_name.upper())
+        self._data = None
+        self._data_path = None
         self.smx_data = None
         if smx_data is not None:
             self.init(smx_data)
@@ -86,11 +171,17 @@ class DatSegBase(object):
         """
         assert isinstance(smx_data, dict)
 
-        s = Schema(self.SCHEMA, extra=ALLOW_EXTRA)
-        self.smx_data = s(smx_data)
+        self.smx_data = self._schema(smx_data)
 
     def info(self):
         return self.full_name
 
-    def load(self, db, root_path):
+    def set_data_file(self, file_path):
+        """ Use file content as data without reading it into memory
+        :param file_path: The path to file
+        """
+        self._data = None
+        self._data_path = file_path
+
+    def load(self, db, root_path, read_fn=read_file):
         raise NotImplementedError()
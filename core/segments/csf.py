@@ -4,13 +4,18 @@
 # The BSD-3-Clause license for this file can be found in the LICENSE file included with this distribution
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
+import shutil
 from os import path
-from jinja2 import Template
-from subprocess import run, PIPE
-from tempfile import gettempdir
+from pathlib import Path
+from functools import lru_cache
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
 from voluptuous import Optional, Required, Range, All, Any
 
-from .base import DatSegBase, get_full_path
+from .base import DatSegBase, read_file, get_full_path, parse_int
+
+# Validator for key verification and target index
+VERIF_INDEX = All(int, Range(0, 3))
 
 CSF_TEMPLATE = '''
 [Header]
@@ -44,9 +49,7 @@ CSF_TEMPLATE = '''
 [Authenticate Data]
     Verification index = {{ authenticate_data.verification_index }}
     Blocks = \\
-    {% for item in authenticate_data.blocks -%}
-    {{ '0x%X' % item.address }} {{ '0x%X' % item.offset }} {{ '0x%X' % item.size }} "{{ item.file }}", \\
-    {% endfor %}
+{{ authenticate_blocks }}
 
 {% if install_secret_key -%}             
 [Install Secret Key]
@@ -62,13 +65,29 @@ CSF_TEMPLATE = '''
     Verification index = {{ decrypt_data.verification_index }}
     Mac Bytes = {{ decrypt_data.mac_bytes }}
     Blocks = \\
-    {% for item in decrypt_data.blocks -%}
-    {{ '0x%X' % item.address }} {{ '0x%X' % item.offset }} {{ '0x%X' % item.size }} "{{ item.file }}", \\
-    {% endfor %}
+{{ decrypt_blocks }}
 {%- endif %}
 '''
 
 
+def _csf_blocks(section):
+    """ Format data blocks of CSF section as lines of 'Blocks = ' list (the template loop is too slow for big images)
+    :param section: The 'authenticate_data' or 'decrypt_data' dictionary
+    :return: formatted text
+    """
+    blocks = section.get('blocks', []) if section else []
+    lines = ['    0x{:X} 0x{:X} 0x{:X} "{}", \\\n'.format(b['address'], b['offset'], b['size'], b.get('file', ''))
+             for b in blocks]
+    return "".join(lines) + "    "
+
+
+@lru_cache(maxsize=None)
+def _csf_template():
+    """ Return CSF template compiled on first use (jinja2 is imported only when a CSF is generated) """
+    from jinja2 import Template
+    return Template(CSF_TEMPLATE)
+
+
 class CST(object):
 
     @property
@@ -78,43 +97,95 @@ class CST(object):
 
     def __init__(self, cst_exe, temp_dir=None):
         self._cst_exe = cst_exe
-        self._tmp_dir = gettempdir() if temp_dir is None else path.realpath(temp_dir)
-        self._dek_bin = path.join(self._tmp_dir, "dek.bin")
-        self._csf_txt = path.join(self._tmp_dir, "csf.txt")
-        self._boot_bin = path.join(self._tmp_dir, "boot.bin")
+        # without temp_dir the own directory is created on first use, so concurrent jobs never share files,
+        # it's removed by finish() or close() (holds CSF and keys)
+        self._own_dir = temp_dir is None
+        self._tmp_dir = None if temp_dir is None else path.realpath(temp_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def close(self):
+        """ Remove own temp directory, the next job creates new one """
+        if self._own_dir and self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    @property
+    def tmp_dir(self):
+        if self._tmp_dir is None:
+            self._tmp_dir = mkdtemp(prefix='cst_')
+        return self._tmp_dir
+
+    @property
+    def _dek_bin(self):
+        return path.join(self.tmp_dir, "dek.bin")
+
+    @property
+    def _csf_txt(self):
+        return path.join(self.tmp_dir, "csf.txt")
+
+    @property
+    def _boot_bin(self):
+        return path.join(self.tmp_dir, "boot.bin")
+
+    def _start(self, *args):
+        return Popen([self._cst_exe] + list(args), stdout=PIPE, stderr=PIPE, text=True)
 
     def _run(self, *args):
-        ret = run([self._cst_exe] + list(args), stdout=PIPE, stderr=PIPE, text=True)
+        return self._wait(self._start(*args))
+
+    @staticmethod
+    def _wait(proc):
+        stdout, stderr = proc.communicate()
 
-        if ret.returncode != 0:
-            raise Exception(ret.stderr)
+        if proc.returncode != 0:
+            raise Exception(stderr)
 
-        if 'error:' in ret.stdout:
-            raise Exception(ret.stdout)
+        if 'error:' in stdout:
+            raise Exception(stdout)
 
-        return ret.stdout
+        return stdout
 
     def gen_cst(self, smx_data):
         assert isinstance(smx_data, dict)
 
-        csf_txt = Template(CSF_TEMPLATE).render(smx_data)
-        with open(self._csf_txt, 'w') as f:
-            f.write(csf_txt)
-
-    def process(self, out_path, cert_path=None):
+        csf_txt = _csf_template().render(smx_data,
+                                         authenticate_blocks=_csf_blocks(smx_data.get('authenticate_data')),
+                                         decrypt_blocks=_csf_blocks(smx_data.get('decrypt_data')))
+        Path(self._csf_txt).write_text(csf_txt)
 
+    def start(self, out_path, cert_path=None):
+        """ Start CST processing in background, every CST object without temp_dir runs in own mkdtemp() directory
+        :param out_path: The output file path
+        :param cert_path: The certificate file path
+        :return: The running process, pass it into finish()
+        """
         if not path.exists(self._csf_txt):
             raise Exception(f"File doesnt exist: {self._csf_txt}")
 
         if cert_path is not None:
             if not path.exists(cert_path):
                 raise Exception()
-            ret = self._run('-i', self._csf_txt, '-o', out_path, '-c', cert_path)
+            return self._start('-i', self._csf_txt, '-o', out_path, '-c', cert_path)
 
-        else:
-            ret = self._run('-i', self._csf_txt, '-o', out_path)
+        return self._start('-i', self._csf_txt, '-o', out_path)
 
-        return ret
+    def finish(self, proc):
+        """ Wait for CST process started by start(), check its result and remove own temp directory
+        :param proc: The running process
+        :return: CST output
+        """
+        try:
+            return self._wait(proc)
+        finally:
+            self.close()
+
+    def process(self, out_path, cert_path=None):
+        return self.finish(self.start(out_path, cert_path))
 
 
 class ErrorCSF(Exception):
@@ -186,7 +257,7 @@ class DatSegCSF(DatSegBase):
             Required('engine'): All(str, Any('CAAM'))
         },
         Required('install_srk'): {
-            Required('source_index'): All(int, Range(0, 3)),
+            Required('source_index'): VERIF_INDEX,
             Required('file'): str
         },
         Required('install_csfk'): {
@@ -197,40 +268,41 @@ class DatSegCSF(DatSegBase):
             Required('features'): str
         }]),
         Required('install_key'): {
-            Required('verification_index'): All(int, Range(0, 3)),
-            Required('target_index'): All(int, Range(0, 3)),
+            Required('verification_index'): VERIF_INDEX,
+            Required('target_index'): VERIF_INDEX,
             Required('file'): str
         },
         Optional('authenticate_data'): {
-            Required('verification_index'): All(int, Range(0, 3)),
+            Required('verification_index'): VERIF_INDEX,
             Required('blocks'): All(list, [{
-                Required('address'): Any(int, All(str, lambda v: int(v, 0))),
-                Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
-                Required('size'): Any(int, All(str, lambda v: int(v, 0)))
+                Required('address'): parse_int,
+                Required('offset'): parse_int,
+                Required('size'): parse_int
             }]),
         },
         Optional('install_secret_key'): {
-            Required('verification_index'): All(int, Range(0, 3)),
-            Required('target_index'): All(int, Range(0, 3)),
+            Required('verification_index'): VERIF_INDEX,
+            Required('target_index'): VERIF_INDEX,
             Required('key_path'): str,
             Required('key_length'): int,
-            Required('blob_address'): Any(int, All(str, lambda v: int(v, 0)))
+            Required('blob_address'): parse_int
         },
         Optional('decrypt_data'): {
-            Required('verification_index'): All(int, Range(0, 3)),
+            Required('verification_index'): VERIF_INDEX,
             Required('mac_bytes'): int,
             Required('blocks'): All(list, [{
-                Required('address'): Any(int, All(str, lambda v: int(v, 0))),
-                Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
-                Required('size'): Any(int, All(str, lambda v: int(v, 0)))
+                Required('address'): parse_int,
+                Required('offset'): parse_int,
+                Required('size'): parse_int
             }])
         }
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
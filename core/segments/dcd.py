@@ -4,9 +4,8 @@
 # The BSD-3-Clause license for this file can be found in the LICENSE file included with this distribution
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
-from imx.img import SegDCD
-from .base import DatSegBase, get_full_path
-from voluptuous import Optional, Required, All, Any
+from .base import DatSegBase, read_file, read_text, get_full_path, parse_int
+from voluptuous import Optional, Required, Any
 
 
 class ErrorDCD(Exception):
@@ -26,27 +25,28 @@ class DatSegDCD(DatSegBase):
     MARK = 'dcd'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required(Any('data', 'file'), msg="required key 'data' or 'file' not provided"): str,
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
-        if 'data' not in self.smx_data:
+        from imx.img import SegDCD
+
+        if 'data' in self.smx_data:
             dcd_obj = SegDCD.parse_txt(self.smx_data['data'])
         else:
             file_path = get_full_path(root_path, self.smx_data['file'])[0]
             if file_path.endswith(".txt"):
-                with open(file_path, 'r') as f:
-                    dcd_obj = SegDCD.parse_txt(f.read())
+                dcd_obj = SegDCD.parse_txt(read_text(file_path, read_fn))
             else:
-                with open(file_path, 'rb') as f:
-                    dcd_obj = SegDCD.parse(f.read())
+                dcd_obj = SegDCD.parse(read_fn(file_path))
 
         self.data = dcd_obj.export()
@@ -5,8 +5,7 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 
-import fdt
-from .base import DatSegBase, get_full_path
+from .base import DatSegBase, read_file, read_text, get_full_path, parse_int
 from voluptuous import Optional, Required, All, Any
 
 
@@ -29,31 +28,30 @@ class DatSegFDT(DatSegBase):
     MARK = 'fdt'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required('file'): str,
         Optional('mode', default='disabled'): All(str, Any('disabled', 'merge')),
         Optional('data'): str
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
+        import fdt
+
         file_path = get_full_path(root_path, self.smx_data['file'])[0]
         if file_path.endswith(".dtb"):
-            with open(file_path, 'rb') as f:
-                fdt_obj = fdt.parse_dtb(f.read())
+            fdt_obj = fdt.parse_dtb(read_fn(file_path))
         else:
-            with open(file_path, 'r') as f:
-                fdt_obj = fdt.parse_dts(f.read())
+            fdt_obj = fdt.parse_dts(read_text(file_path, read_fn))
 
         if 'data' in self.smx_data and self.smx_data['mode'] == 'merge':
-            if 'data' not in self.smx_data:
-                raise Exception()
             fdt_obj.merge(fdt.parse_dts(self.smx_data['data']))
 
         if fdt_obj.header.version is None:
@@ -6,7 +6,8 @@
 
 import imx
 import uboot
-from .base import DatSegBase, get_data_segment, get_full_path
+from concurrent.futures import ThreadPoolExecutor
+from .base import DatSegBase, read_file, get_data_segment, get_full_path, parse_int
 from voluptuous import Optional, Required, All, Any, Schema, ALLOW_EXTRA
 
 img_types = {
@@ -58,29 +59,41 @@ class DatSegIMX2(DatSegBase):
 
     SCHEMA2 = {
         Optional('description'): str,
-        Required('address'): Any(int, All(str, lambda v: int(v, 0))),
-        Optional('offset', default=0x400): Any(int, All(str, lambda v: int(v, 0))),
+        Required('address'): parse_int,
+        Optional('offset', default=0x400): parse_int,
         Optional('plugin', default='no'): All(str, Any('yes', 'no')),
-        Optional('version', default=0x41): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('version', default=0x41): parse_int,
         Optional('dcd_seg'): str,
         Required('app_seg'): str,
         Optional('csf_seg'): str
     }
 
     MARK = 'imx2'
-    SCHEMA = Any(Schema(SCHEMA1, extra=ALLOW_EXTRA), Schema(SCHEMA2, extra=ALLOW_EXTRA))
+
+    # compiled validators for image from file (SCHEMA1) and image build from parts (SCHEMA2)
+    _schema1 = Schema(SCHEMA1, extra=ALLOW_EXTRA)
+    _schema2 = Schema(SCHEMA2, extra=ALLOW_EXTRA)
 
     def __init__(self, name, smx_data=None):
         super().__init__(name, smx_data)
         self.address = None
         self.dcd = None
 
-    def load(self, db, root_path):
+    def init(self, smx_data):
+        """ Initialize IMX segments, the schema is selected by presence of 'file' key
+        :param smx_data: ...
+        """
+        assert isinstance(smx_data, dict)
+
+        self.smx_data = (self._schema1 if 'file' in smx_data else self._schema2)(smx_data)
+
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
         if 'file' not in self.smx_data:
@@ -97,8 +110,7 @@ class DatSegIMX2(DatSegBase):
         else:
             img_path = get_full_path(root_path, self.smx_data['file'])[0]
             if self.smx_data['mode'] == 'disabled':
-                with open(img_path, 'rb') as f:
-                    self.data = f.read()
+                self.data = read_fn(img_path)
             else:
                 env_img = uboot.EnvImgOld(self.smx_data['mark'])
                 env_img.open_img(img_path)
@@ -138,12 +150,13 @@ class DatSegIMX2B(DatSegBase):
         self.address = None
         self.dcd = None
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
 
@@ -189,32 +202,44 @@ class DatSegIMX3(DatSegBase):
         Optional('mark', default='bootcmd='): str,
         Optional('eval'): str,
 
-        Required('address'): Any(int, All(str, lambda v: int(v, 0))),
-        Optional('offset', default=0x400): Any(int, All(str, lambda v: int(v, 0))),
+        Required('address'): parse_int,
+        Optional('offset', default=0x400): parse_int,
         Optional('plugin', default='no'): All(str, Any('yes', 'no')),
-        Optional('version', default=0x41): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('version', default=0x41): parse_int,
         Optional('dcdseg'): str,
         Required('images'): All(list, [{
-            Optional('address', default=0): Any(int, All(str, lambda v: int(v, 0))),
+            Optional('address', default=0): parse_int,
             Required('type'): All(str, Any(*img_types.keys())),
             Required('file'): str
         }]),
     }
 
     MARK = 'imx3'
-    SCHEMA = Any(Schema(SCHEMA1, extra=ALLOW_EXTRA), Schema(SCHEMA2, extra=ALLOW_EXTRA))
+
+    # compiled validators for image from file (SCHEMA1) and image build from parts (SCHEMA2)
+    _schema1 = Schema(SCHEMA1, extra=ALLOW_EXTRA)
+    _schema2 = Schema(SCHEMA2, extra=ALLOW_EXTRA)
 
     def __init__(self, name, smx_data=None):
         super().__init__(name, smx_data)
         self.address = None
         self.dcd = None
 
-    def load(self, db, root_path):
+    def init(self, smx_data):
+        """ Initialize IMX segments, the schema is selected by presence of 'file' key
+        :param smx_data: ...
+        """
+        assert isinstance(smx_data, dict)
+
+        self.smx_data = (self._schema1 if 'file' in smx_data else self._schema2)(smx_data)
+
+    def load(self, db, root_path, read_fn=read_file):
         """ load DCD segments
         :param db: ...
         :param root_path: ...
+        :param read_fn: ...
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
         if 'file' not in self.smx_data:
@@ -223,9 +248,17 @@ class DatSegIMX3(DatSegBase):
                 self.dcd = get_data_segment(db, self.smx_data['dcdseg']).data
                 imx_obj.dcd = imx.img.SegDCD.parse(self.dcd)
 
-            for image in self.smx_data['images']:
-                with open(get_full_path(root_path, image['file'])[0], 'rb') as f:
-                    imx_obj.add_image(f.read(), img_types[image['type']], image['address'])
+            images = self.smx_data['images']
+            img_paths = get_full_path(root_path, *[image['file'] for image in images])
+            if len(img_paths) > 1:
+                # the images are independent files, read them concurrently (results keep the order)
+                with ThreadPoolExecutor(max_workers=min(8, len(img_paths))) as executor:
+                    img_data = list(executor.map(read_fn, img_paths))
+            else:
+                img_data = [read_fn(img_path) for img_path in img_paths]
+
+            for image, data in zip(images, img_data):
+                imx_obj.add_image(data, img_types[image['type']], image['address'])
 
             self.address = imx_obj.address + imx_obj.offset
             self.data = imx_obj.export()
@@ -233,8 +266,7 @@ class DatSegIMX3(DatSegBase):
         else:
             img_path = get_full_path(root_path, self.smx_data['file'])[0]
             if self.smx_data['mode'] == 'disabled':
-                with open(img_path, 'rb') as f:
-                    self.data = f.read()
+                self.data = read_fn(img_path)
             else:
                 env_img = uboot.EnvImgOld(self.smx_data['mark'])
                 env_img.open_img(img_path)
@@ -5,8 +5,8 @@
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
 
-from .base import DatSegBase, get_full_path
-from voluptuous import Optional, Required, All, Any
+from .base import DatSegBase, read_file, get_full_path, parse_int
+from voluptuous import Optional, Required
 
 
 class ErrorRAW(Exception):
@@ -26,18 +26,18 @@ class DatSegRAW(DatSegBase):
     MARK = 'raw'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required('file'): str
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ Load content
         :param db:
         :param root_path:
+        :param read_fn:
         :return:
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
-        with open(get_full_path(root_path, self.smx_data['file'])[0], 'rb') as f:
-            self.data = f.read()
+        self.set_data_file(get_full_path(root_path, self.smx_data['file'])[0])
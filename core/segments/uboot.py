@@ -6,14 +6,15 @@
 
 import os
 import uboot
-from .base import DatSegBase, get_full_path
-from voluptuous import Optional, Required, All, Any, Length
+from .base import DatSegBase, read_file, read_text, get_full_path, parse_int
+from voluptuous import Optional, Required, All, Any, In, Length
 
 
-supported_images = [item[0] for item in uboot.EnumImageType]
-supported_archs = [item[0] for item in uboot.EnumArchType]
-supported_oss = [item[0] for item in uboot.EnumOsType]
-supported_compressions = [item[0] for item in uboot.EnumCompressionType]
+# supported header values (frozen sets for constant time membership test in schema)
+supported_images = frozenset(item[0] for item in uboot.EnumImageType)
+supported_archs = frozenset(item[0] for item in uboot.EnumArchType)
+supported_oss = frozenset(item[0] for item in uboot.EnumOsType)
+supported_compressions = frozenset(item[0] for item in uboot.EnumCompressionType)
 
 
 class ErrorUBI(Exception):
@@ -51,28 +52,29 @@ class DatSegUBI(DatSegBase):
     MARK = 'ubi'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required('file'): str,
         Optional('mark', default='bootcmd='): str,
         Optional('mode', default='disabled'): All(str, Any('disabled', 'merge', 'replace')),
         Optional('eval'): str
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ Load content
         :param db:
         :param root_path:
+        :param read_fn:
         :return:
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
+        file_path = get_full_path(root_path, self.smx_data['file'])[0]
         if self.smx_data['mode'] == 'disabled':
-            with open(get_full_path(root_path, self.smx_data['file'])[0], 'rb') as f:
-                self.data = f.read()
+            self.set_data_file(file_path)
         else:
             img_obj = uboot.EnvImgOld(self.smx_data['mark'])
-            img_obj.open_img(get_full_path(root_path, self.smx_data['file'])[0])
+            img_obj.open_img(file_path)
             if self.smx_data['mode'] == 'replace':
                 img_obj.clear()
             img_obj.load(self.smx_data['eval'])
@@ -100,26 +102,27 @@ class DatSegUBX(DatSegBase):
     MARK = 'ubx'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required(Any('data', 'file'), msg="required key 'data' or 'file' not provided"): Any(str, list),
         Optional('header'): {
             Optional('name', default=''): All(str, Length(min=0, max=32)),
-            Optional('entry_address', default=0): Any(int, All(str, lambda v: int(v, 0))),
-            Optional('load_address', default=0): Any(int, All(str, lambda v: int(v, 0))),
-            Optional('image_type', default='firmware'): All(str, Any(*supported_images)),
-            Optional('target_arch', default='arm'): All(str, Any(*supported_archs)),
-            Optional('running_os', default='linux'): All(str, Any(*supported_oss)),
-            Optional('compression', default='none'): All(str, Any(*supported_compressions))
+            Optional('entry_address', default=0): parse_int,
+            Optional('load_address', default=0): parse_int,
+            Optional('image_type', default='firmware'): All(str, In(supported_images)),
+            Optional('target_arch', default='arm'): All(str, In(supported_archs)),
+            Optional('running_os', default='linux'): All(str, In(supported_oss)),
+            Optional('compression', default='none'): All(str, In(supported_compressions))
         }
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ Load content
         :param db:
         :param root_path:
+        :param read_fn:
         :return:
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
         if 'header' in self.smx_data:
@@ -143,22 +146,26 @@ class DatSegUBX(DatSegBase):
                 compress='none'
             )
 
+        # resolve input file paths once ('file' is single path or list of paths for multi image)
+        files = self.smx_data.get('file')
+        if files is None:
+            img_paths = []
+        else:
+            img_paths = get_full_path(root_path, *(files if isinstance(files, list) else [files]))
+
         if img_obj.header.image_type == uboot.EnumImageType.FIRMWARE:
-            with open(get_full_path(root_path, self.smx_data['file'])[0], 'rb') as f:
-                img_obj.data = f.read()
+            img_obj.data = read_fn(img_paths[0])
         elif img_obj.header.image_type == uboot.EnumImageType.SCRIPT:
-            if 'data' is self.smx_data:
-                img_obj.load(self.smx_data['data'])
+            script_data = self.smx_data.get('data')
+            if script_data is not None:
+                img_obj.load(script_data)
             else:
-                with open(get_full_path(root_path, self.smx_data['file'])[0], 'r') as f:
-                    img_obj.load(f.read())
+                img_obj.load(read_text(img_paths[0], read_fn))
         elif img_obj.header.image_type == uboot.EnumImageType.MULTI:
-            for img_path in get_full_path(root_path, self.smx_data['file']):
-                with open(img_path, 'rb') as f:
-                    img_obj.append(uboot.parse_img(f.read()))
+            for img_path in img_paths:
+                img_obj.append(uboot.parse_img(read_fn(img_path)))
         else:
-            with open(get_full_path(root_path, self.smx_data['file'])[0], 'rb') as f:
-                img_obj.data = f.read()
+            img_obj.data = read_fn(img_paths[0])
 
         self.data = img_obj.export()
 
@@ -175,24 +182,25 @@ class DatSegUBT(DatSegBase):
     MARK = 'ubt'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Required(Any('data', 'file'), msg="required key 'data' or 'file' not provided"): str,
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ Load content
         :param db:
         :param root_path:
+        :param read_fn:
         :return:
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
-        if 'file' in self.smx_data:
-            its_path = get_full_path(root_path, self.smx_data['file'])[0]
+        its_file = self.smx_data.get('file')
+        if its_file is not None:
+            its_path = get_full_path(root_path, its_file)[0]
             its_dir = os.path.dirname(its_path)
-            with open(its_path, 'r') as f:
-                data = f.read()
+            data = read_text(its_path, read_fn)
         else:
             its_dir = root_path
             data = self.smx_data['data']
@@ -215,31 +223,31 @@ class DatSegUEV(DatSegBase):
     MARK = 'uev'
     SCHEMA = {
         Optional('description'): str,
-        Optional('address'): Any(int, All(str, lambda v: int(v, 0))),
+        Optional('address'): parse_int,
         Optional('file'): str,
         Optional('mark', default='bootcmd='): str,
         Required('eval'): str
     }
 
-    def load(self, db, root_path):
+    def load(self, db, root_path, read_fn=read_file):
         """ Load content
         :param db:
         :param root_path:
+        :param read_fn:
         """
-        assert isinstance(db, list)
+        assert isinstance(db, dict)
         assert isinstance(root_path, str)
 
-        if 'data' in self.smx_data:
+        env_data = self.smx_data.get('data')
+        if env_data is not None:
             env_obj = uboot.EnvBlob()
-            env_obj.load(self.smx_data['data'])
+            env_obj.load(env_data)
         else:
             file_path = get_full_path(root_path, self.smx_data['file'])[0]
             if file_path.endswith(".txt"):
-                with open(file_path, 'r') as f:
-                    env_obj = uboot.EnvBlob()
-                    env_obj.load(f.read())
+                env_obj = uboot.EnvBlob()
+                env_obj.load(read_text(file_path, read_fn))
             else:
-                with open(file_path, 'rb') as f:
-                    env_obj = uboot.EnvBlob.parse(f.read())
+                env_obj = uboot.EnvBlob.parse(read_fn(file_path))
 
         self.data = env_obj.export()
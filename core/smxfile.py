@@ -6,44 +6,179 @@
 
 
 import os
+import re
 import sys
+import math
+import mmap
+import pickle
+import hashlib
 import yaml
-import jinja2
-from voluptuous import Optional, Required, Range, All, Any, Schema, ALLOW_EXTRA, Invalid
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from voluptuous import Optional, Required, All, Any, In, Schema, ALLOW_EXTRA, Invalid
 
 # internals
 from .segments import DatSegFDT, DatSegDCD, DatSegIMX2, DatSegIMX2B, DatSegIMX3, DatSegRAW, DatSegUBI, \
                       DatSegUBX, DatSegUBT, DatSegUEV, DatSegCSF
-from .fs import mbr, gpt, fat, ext
-from .image import LinuxImage, AndroidImage
+from .segments.base import FileCache, parse_int
+from .fs import mbr
+from . import __version__
+
+# complex data segments which are loaded after (and can include) the simple ones
+_COMPLEX_MARKS = frozenset((DatSegIMX2.MARK, DatSegIMX2B.MARK, DatSegIMX3.MARK))
+
+# use LibYAML based loader if available
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
 
 
 ########################################################################################################################
 # helper functions
 ########################################################################################################################
+_SIZE_UNITS = (('B', 'kB', 'MB', 'GB', 'TB', 'PB'), ('B', 'kiB', 'MiB', 'GiB', 'TiB', 'PiB'))
+
+
 def fmt_size(num, kibibyte=True):
-    base, suffix = [(1000., 'B'), (1024., 'iB')][kibibyte]
-    for x in ['B'] + [x + suffix for x in list('kMGTP')]:
-        if -base < num < base:
-            break
-        num /= base
-    return "{0:3.1f} {1:s}".format(num, x)
+    base = 1024. if kibibyte else 1000.
+    # unit index from logarithm, corrected for floating point rounding at the unit boundaries
+    exp = min(int(math.log(abs(num), base)), 5) if abs(num) >= base else 0
+    if exp < 5 and abs(num) >= base ** (exp + 1):
+        exp += 1
+    elif exp > 0 and abs(num) < base ** exp:
+        exp -= 1
+    return "{0:3.1f} {1:s}".format(num / base ** exp, _SIZE_UNITS[kibibyte][exp])
+
+
+def _fmt_path(base, invalid):
+    """ Format path to invalid value in SMX file
+    :param base: The path of validated section
+    :param invalid: The voluptuous Invalid exception
+    :return: str
+    """
+    parts = [base]
+    for name in invalid.path:
+        if isinstance(name, (str, int)):
+            parts.append(str(name))
+        elif isinstance(name, Required) and isinstance(name.schema, str):
+            parts.append(name.schema)
+    return "/".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _jinja_env():
+    """ Shared Jinja environment for SMX templates, created when the first template is rendered """
+    import jinja2
+    return jinja2.Environment(autoescape=False, cache_size=128, auto_reload=False, undefined=jinja2.StrictUndefined)
+
+
+@lru_cache(maxsize=64)
+def _compile_template(source):
+    """ Compile SMX template, repeatedly opened files are compiled only once """
+    return _jinja_env().from_string(source)
+
+
+def _render_template(source, variables):
+    """ Render SMX template, using of not defined variable is an error
+    :param source: The SMX file content
+    :param variables: The variables values
+    :return: rendered content
+    """
+    from jinja2 import UndefinedError
+    try:
+        return _compile_template(source).render(variables)
+    except UndefinedError as e:
+        raise SMXError("Variable not defined: {}".format(e.message), path='variables')
 
 
-class SafeCustomLoader(yaml.SafeLoader):
+# top-level 'variables' block: the key line followed by indented, empty or comment lines
+# (searched in raw file content, so it tolerates CR-LF line endings)
+_VARIABLES_BLOCK = re.compile(rb'^variables[ \t]*:.*(?:\n(?:[ \t]+.*|[ \t]*\r?|#.*)(?=\n|$))*', re.M)
+
+
+# cache of parsed and validated smx files, it's disabled by default (set IMXMI_CACHE=1 in environment for enabling it)
+_CACHE_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def _code_fingerprint():
+    """ Fingerprint of code which parse and validate smx files: sources of this package (schemas, defaults and
+        data segments classes), python version and versions of libraries used for validation
+    :return: bytes
+    """
+    from importlib import metadata
+
+    key = hashlib.sha1('{}:{}:{}\n'.format(__version__, _CACHE_VERSION, sys.version).encode('utf-8'))
+    for name in ('PyYAML', 'Jinja2', 'voluptuous', 'imx', 'uboot', 'fdt', 'easy-enum'):
+        try:
+            version = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            version = None
+        key.update('{}={}\n'.format(name, version).encode('utf-8'))
+    pkg_dir = os.path.dirname(os.path.abspath(__file__))
+    for root, dirs, files in os.walk(pkg_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                key.update(os.path.relpath(path, pkg_dir).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    key.update(f.read())
+    return key.digest()
+
+
+def _cache_file(raw_data):
+    """ Get cache file path for smx file content
+    :param raw_data: The smx file raw content (bytes-like object)
+    :return: path or None if caching is disabled
+    """
+    if os.environ.get('IMXMI_CACHE', '0') != '1':
+        return None
+    cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'imxmi')
+    key = hashlib.sha1(_code_fingerprint())
+    key.update(raw_data)
+    return os.path.join(cache_dir, key.hexdigest() + '.pkl')
+
+
+def _cache_load(cache_file):
+    """ Load cached content, a missing or unusable cache file is just ignored """
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _cache_store(cache_file, state):
+    """ Store content into cache, failures (read-only home, ...) are ignored """
+    if cache_file is None:
+        return
+    tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except (OSError, pickle.PicklingError):
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+
+class SafeCustomLoader(_SafeLoader):
     def construct_mapping(self, node, deep=False):
         mapping = super(SafeCustomLoader, self).construct_mapping(node, deep=deep)
 
-        # Convert all KEYS to lowercase
-        keys = mapping.keys()
-        for key in keys:
-            if key.startswith('_') or key.endswith('_'):
-                continue
-            value = mapping.pop(key)
-            mapping[key.lower()] = value
+        # Convert all KEYS to lowercase (rebuilt in one pass, the source mapping is not modified while iterating)
+        mapping = {(key if key.startswith('_') or key.endswith('_') else key.lower()): value
+                   for key, value in mapping.items()}
 
-        # Add line number in YAML file for parsed KEY
-        mapping['__line__'] = node.start_mark.line
+        # Add line number in YAML file for parsed KEY (marks are zero based)
+        mapping['__line__'] = node.start_mark.line + 1
         return mapping
 
 
@@ -84,6 +219,12 @@ class SMXError(Exception):
 ########################################################################################################################
 # SMX Classes
 ########################################################################################################################
+
+# partition types and validator shared by all SMX image schemas
+_PART_TYPES = frozenset(item.name for item in mbr.PartitionType)
+_PART_TYPE = All(str, In(_PART_TYPES))
+
+
 class SmxLinuxImage(object):
     """ Boot Image class
 
@@ -110,22 +251,22 @@ class SmxLinuxImage(object):
                   file: str (required)
     """
 
-    supported_parts = [item[0] for item in mbr.PartitionType]
+    supported_parts = _PART_TYPES
 
     SCHEMA = {
         Required('bootloader'): {
-            Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
+            Required('offset'): parse_int,
             Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
         },
         Optional('uboot_env'): {
-            Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
+            Required('offset'): parse_int,
             Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
         },
         Optional('partitions'): All(list, [{
             Optional('name'): str,
-            Optional('type'): All(str, Any(*supported_parts)),
-            Optional('offset'): Any(int, All(str, lambda v: int(v, 0))),
-            Optional('size'): Any(int, All(str, lambda v: int(v, 0))),
+            Optional('type'): _PART_TYPE,
+            Optional('offset'): parse_int,
+            Optional('size'): parse_int,
             Optional('file'): str,
             Optional('data'): All(list, [{
                 Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
@@ -134,6 +275,9 @@ class SmxLinuxImage(object):
         }])
     }
 
+    # compiled validator, built once at class definition
+    _schema = Schema(SCHEMA, extra=ALLOW_EXTRA)
+
     def __init__(self, smx_data):
         """ Init SmxImage
         :param smx_data:
@@ -141,8 +285,7 @@ class SmxLinuxImage(object):
         """
         assert isinstance(smx_data, dict)
 
-        schema = Schema(self.SCHEMA, extra=ALLOW_EXTRA)
-        self.smx_data = schema(smx_data)
+        self.smx_data = self._schema(smx_data)
 
     def save(self, path):
         pass
@@ -175,23 +318,23 @@ class SmxAndroidImage(object):
                   file: str (required)
     """
 
-    PARTS = [item[0] for item in mbr.PartitionType]
+    PARTS = _PART_TYPES
 
     SCHEMA = {
         Required('mbr_type'): str,
         Required('bootloader'): {
-            Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
+            Required('offset'): parse_int,
             Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
         },
         Optional('uboot_env'): {
-            Required('offset'): Any(int, All(str, lambda v: int(v, 0))),
+            Required('offset'): parse_int,
             Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
         },
         Optional('partitions'): All(list, [{
             Optional('name'): str,
-            Optional('type'): All(str, Any(*PARTS)),
-            Optional('offset'): Any(int, All(str, lambda v: int(v, 0))),
-            Optional('size'): Any(int, All(str, lambda v: int(v, 0))),
+            Optional('type'): _PART_TYPE,
+            Optional('offset'): parse_int,
+            Optional('size'): parse_int,
             Optional('file'): str,
             Optional('data'): All(list, [{
                 Required(Any('image', 'file'), msg="required key 'image' or 'file' not provided"): str,
@@ -200,6 +343,9 @@ class SmxAndroidImage(object):
         }])
     }
 
+    # compiled validator, built once at class definition
+    _schema = Schema(SCHEMA, extra=ALLOW_EXTRA)
+
     def __init__(self, smx_data):
         """ Init SmxImage
         :param smx_data:
@@ -207,8 +353,7 @@ class SmxAndroidImage(object):
         """
         assert isinstance(smx_data, dict)
 
-        schema = Schema(self.SCHEMA, extra=ALLOW_EXTRA)
-        self.smx_data = schema(smx_data)
+        self.smx_data = self._schema(smx_data)
 
     def save(self, path):
         pass
@@ -230,6 +375,19 @@ class SmxFile(object):
         DatSegIMX2B.MARK: DatSegIMX2B
     }
 
+    # top-level SMX keys dispatch: {key: handler(self, key, value)}
+    _HANDLERS = {
+        'name': lambda self, key, value: setattr(self, 'name', value),
+        'description': lambda self, key, value: setattr(self, 'description', value),
+        'platform': lambda self, key, value: setattr(self, 'platform', value),
+        'data_segments': lambda self, key, value: self._open_data_segments(value),
+        'linux_sd_image': lambda self, key, value: self._open_image(SmxLinuxImage, key, value),
+        'android_sd_image': lambda self, key, value: self._open_image(SmxAndroidImage, key, value)
+    }
+
+    # attributes restored from cache of parsed smx files
+    _CACHED_ATTRS = ('name', 'description', 'platform', 'image', 'data', '_simple', '_complex')
+
     def __init__(self, file=None, auto_load=False):
         # private
         self.name = ""
@@ -238,6 +396,8 @@ class SmxFile(object):
         self.path = None
         self.image = None
         self.data = []
+        self._simple = []
+        self._complex = []
         # init
         if file is not None:
             self.open(file, auto_load)
@@ -253,25 +413,47 @@ class SmxFile(object):
         """
         assert isinstance(file, str)
 
-        # open smx file
-        with open(file, 'r') as f:
-            txt_data = f.read()
+        # set absolute path to core file
+        self.path = os.path.abspath(os.path.dirname(file))
 
-        # load smx file
-        smx_data = yaml.load(txt_data, Loader=yaml.SafeLoader)
-        if 'variables' in smx_data:
-            var_data = smx_data['variables']
-            txt_data = jinja2.Template(txt_data).render(var_data)
-            smx_data = yaml.load(txt_data, Loader=SafeCustomLoader)
-        else:
-            smx_data = yaml.load(txt_data, Loader=SafeCustomLoader)
+        # open smx file, the content is mapped (not read into memory) for hashing and scanning
+        with open(file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else memoryview(b'') as raw_data:
+                # reuse parsed and validated content of already opened smx file
+                cache_file = _cache_file(raw_data)
+                state = _cache_load(cache_file)
+                if state is not None:
+                    for name, value in zip(self._CACHED_ATTRS, state):
+                        setattr(self, name, value)
+                else:
+                    self._parse(f, raw_data, file)
+                    _cache_store(cache_file, tuple(getattr(self, name) for name in self._CACHED_ATTRS))
 
-        # check if all variables have been defined
-        # if re.search("\{\{.*x.*\}\}", text_data) is not None:
-        #   raise Exception("Some variables are not defined !")
+        if auto_load:
+            self.load()
 
-        # set absolute path to core file
-        self.path = os.path.abspath(os.path.dirname(file))
+    def _parse(self, stream, raw_data, file):
+        """ Parse and validate content of smx file
+        :param stream: The smx file opened in binary mode
+        :param raw_data: The smx file raw content (bytes-like object)
+        :param file: The smx file path (used in error messages)
+        """
+        # load smx file
+        # only the variables block is parsed before rendering, the whole document is parsed once
+        match = _VARIABLES_BLOCK.search(raw_data)
+        if match is not None:
+            # the content is decoded only when it must be rendered
+            txt_data = str(raw_data, 'utf-8')
+            if '\r' in txt_data:
+                # universal newlines, as with text mode reading
+                txt_data = txt_data.replace('\r\n', '\n').replace('\r', '\n')
+            var_data = yaml.load(match.group(0), Loader=_SafeLoader)['variables']
+            smx_data = yaml.load(_render_template(txt_data, var_data or {}), Loader=SafeCustomLoader)
+        else:
+            # without variables the document is streamed into parser directly from file
+            stream.seek(0)
+            smx_data = yaml.load(stream, Loader=SafeCustomLoader)
 
         # clear all data
         self.name = ""
@@ -279,67 +461,13 @@ class SmxFile(object):
         self.platform = None
         self.image = None
         self.data = []
+        self._simple = []
+        self._complex = []
 
         for key, value in smx_data.items():
-            if key == 'name':
-                self.name = value
-
-            elif key == 'description':
-                self.description = value
-
-            elif key == 'platform':
-                self.platform = value
-
-            elif key == 'data_segments':
-                for full_name, data in value.items():
-                    if full_name.startswith('_') or full_name.endswith('_'):
-                        continue
-                    # set error params
-                    error_line = data.get('__line__')
-                    error_path = full_name
-                    try:
-                        item_name, item_type = full_name.split('.')
-                    except ValueError:
-                        raise SMXError("not supported data-segment format: {}".format(full_name),
-                                       error_line, error_path)
-                    # case tolerant type
-                    item_type = item_type.lower()
-                    if item_type not in self.DS.keys():
-                        raise SMXError("not supported data-segment type: {}".format(item_type), error_line, error_path)
-                    try:
-                        data_segment = self.DS[item_type](item_name, data)
-                    except Invalid as e:
-                        for name in e.path:
-                            if isinstance(name, (str, int)):
-                                error_path += "/{}".format(name)
-                            elif isinstance(name, Required) and isinstance(name.schema, str):
-                                error_path += "/{}".format(name.schema)
-                        raise SMXError(e.error_message, error_line, error_path)
-                    self.data.append(data_segment)
-
-            elif key == 'linux_sd_image':
-                try:
-                    self.image = SmxLinuxImage(value)
-                except Invalid as e:
-                    error_path = key
-                    for name in e.path:
-                        if isinstance(name, (str, int)):
-                            error_path += "/{}".format(name)
-                        elif isinstance(name, Required) and isinstance(name.schema, str):
-                            error_path += "/{}".format(name.schema)
-                    raise SMXError(e.error_message, value.get('__line__'), error_path)
-
-            elif key == 'android_sd_image':
-                try:
-                    self.image = SmxAndroidImage(value)
-                except Invalid as e:
-                    error_path = key
-                    for name in e.path:
-                        if isinstance(name, (str, int)):
-                            error_path += "/{}".format(name)
-                        elif isinstance(name, Required) and isinstance(name.schema, str):
-                            error_path += "/{}".format(name.schema)
-                    raise SMXError(e.error_message, value.get('__line__'), error_path)
+            handler = self._HANDLERS.get(key)
+            if handler is not None:
+                handler(self, key, value)
 
         if self.platform is None:
             raise SMXError("Required key 'platform' not provided in {}".format(file))
@@ -348,19 +476,60 @@ class SmxFile(object):
         if not self.data:
             raise SMXError("Required key 'data_segments' not provided in {}".format(file))
 
-        if auto_load:
-            self.load()
+    def _open_data_segments(self, value):
+        """ Create data segments from 'data_segments' section
+        :param value: The parsed 'data_segments' section
+        """
+        for full_name, data in value.items():
+            if full_name.startswith('_') or full_name.endswith('_'):
+                continue
+            # set error params
+            error_line = data.get('__line__')
+            error_path = full_name
+            item_name, sep, item_type = full_name.rpartition('.')
+            if not sep or not item_name or '.' in item_name:
+                raise SMXError("not supported data-segment format: {}".format(full_name), error_line, error_path)
+            # case tolerant type
+            item_type = item_type.lower()
+            data_segment_cls = self.DS.get(item_type)
+            if data_segment_cls is None:
+                raise SMXError("not supported data-segment type: {}".format(item_type), error_line, error_path)
+            try:
+                data_segment = data_segment_cls(item_name, data)
+            except Invalid as e:
+                raise SMXError(e.error_message, error_line, _fmt_path(error_path, e))
+            self.data.append(data_segment)
+            (self._complex if item_type in _COMPLEX_MARKS else self._simple).append(data_segment)
+
+    def _open_image(self, cls, key, value):
+        """ Create image description from '<system>_sd_image' section
+        :param cls: The image class
+        :param key: The section name
+        :param value: The parsed section
+        """
+        try:
+            self.image = cls(value)
+        except Invalid as e:
+            raise SMXError(e.error_message, value.get('__line__'), _fmt_path(key, e))
 
     def load(self):
-        # load simple data segments
-        for item in self.data:
-            if item.MARK not in (DatSegIMX2.MARK, DatSegIMX2B.MARK, DatSegIMX3.MARK):
-                item.load(self.data, self.path)
-
-        # load complex data segments which can include simple data segments
-        for item in self.data:
-            if item.MARK in (DatSegIMX2.MARK, DatSegIMX2B.MARK, DatSegIMX3.MARK):
-                item.load(self.data, self.path)
-
-
-
+        # index data segments by name for lookups from complex data segments
+        db = {item.index_key: item for item in self.data}
+        # data segments which use the same source file share single read
+        file_cache = FileCache()
+
+        try:
+            # load simple data segments, they are independent of each other so are loaded concurrently
+            # (set IMXMI_SERIAL=1 in environment for loading them one by one, useful for debugging)
+            if len(self._simple) > 1 and os.environ.get('IMXMI_SERIAL', '0') == '0':
+                with ThreadPoolExecutor(max_workers=min(8, len(self._simple))) as executor:
+                    list(executor.map(lambda item: item.load(db, self.path, file_cache), self._simple))
+            else:
+                for item in self._simple:
+                    item.load(db, self.path, file_cache)
+
+            # load complex data segments which can include simple data segments
+            for item in self._complex:
+                item.load(db, self.path, file_cache)
+        finally:
+            file_cache.clear()
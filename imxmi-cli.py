@@ -8,7 +8,6 @@
 
 import os
 import sys
-import yaml
 import click
 # local module
 from core import __version__, LinuxImage
@@ -39,12 +38,13 @@ def cli():
 @click.argument('file', nargs=1, type=click.Path(exists=True))
 def info(system, file):
 
-    if system is 'linux':
-        with LinuxImage.open(file) as img:
-            img.parse()
-            click.echo(img.info())
-    else:
-        pass
+    if system != 'linux':
+        # android images are not supported yet
+        return
+
+    with LinuxImage.open(file) as img:
+        img.parse()
+        click.echo(img.info())
 
 
 @cli.command(short_help="Extract i.MX boot image content")
@@ -53,12 +53,13 @@ def info(system, file):
               default='linux', show_default=True, help="Image OS type")
 @click.argument('file', nargs=1, type=click.Path(exists=True))
 def extract(system, outdir, file):
-    if system is 'linux':
-        with LinuxImage.open(file) as img:
-            img.parse()
-            click.echo(img.info())
-    else:
-        pass
+    if system != 'linux':
+        # android images are not supported yet
+        return
+
+    with LinuxImage.open(file) as img:
+        img.parse()
+        click.echo(img.info())
 
 
 def main():
@@ -4,6 +4,103 @@
 # The BSD-3-Clause license for this file can be found in the LICENSE file included with this distribution
 # or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
 
+import os
+import gzip
 import pytest
 import core
+from io import BytesIO, BufferedReader
+from struct import pack, pack_into
 
+SECTOR_SIZE = 512
+
+
+def build_fat16_image():
+    """ Build small FAT16 image with one contiguous and one fragmented (multi-run) file """
+    bs = core.fat.BootSector()
+    bs.oem_name = 'TEST'
+    bs.sectors_per_cluster = 1
+    bs.fat_copies = 1
+    bs.max_root_entries = 16
+    bs.total_sectors = 16
+    bs.sectors_per_fat = 1
+    bs.volume_label = 'TEST'
+
+    image = bytearray(bs.total_sectors * SECTOR_SIZE)
+    image[:SECTOR_SIZE] = bs.export()
+    fat_table = bytearray(bs.fat_size)
+    pack_into('<HH', fat_table, 0, 0xFFF8, 0xFFFF)
+    root_dir = pack(core.fat.RootEntry.SFN_FORMAT, b'TEST', 0x08, 0, 0, 0, 0x21, 0x21, 0, 0, 0x21, 0, 0)
+    content = {}
+
+    for name, clusters, size in (('CONTIGUOBIN', [2, 3, 4], 1300), ('MULTIRUNBIN', [5, 9, 10, 6], 1800)):
+        data = bytes((i * 7 + len(content)) & 0xFF for i in range(size))
+        for i, cluster in enumerate(clusters):
+            pack_into('<H', fat_table, cluster * 2, clusters[i + 1] if i + 1 < len(clusters) else 0xFFFF)
+            offset = bs.data_offset + (cluster - 2) * bs.cluster_size
+            chunk = data[i * bs.cluster_size:(i + 1) * bs.cluster_size]
+            image[offset:offset + len(chunk)] = chunk
+        root_dir += pack(core.fat.RootEntry.SFN_FORMAT, name.encode(), 0x20, 0, 0, 0, 0x21, 0x21, 0, 0, 0x21,
+                         clusters[0], size)
+        content[name] = data
+
+    image[bs.fat_offset:bs.fat_offset + bs.fat_size] = fat_table
+    image[bs.root_offset:bs.root_offset + len(root_dir)] = root_dir
+    return bytes(image), content
+
+
+def test_export_file(tmp_path, monkeypatch):
+    image, content = build_fat16_image()
+    image_path = tmp_path / "fat16.img"
+    image_path.write_bytes(image)
+
+    # simulate OS limit of single read and force reading in more chunks
+    pread = os.pread
+    monkeypatch.setattr(os, 'pread', lambda fd, size, offset: pread(fd, min(size, 100), offset))
+    monkeypatch.setattr(core.fat.FAT, 'READ_CHUNK_SIZE', 300)
+
+    with open(image_path, 'rb') as stream:
+        for fat in (core.fat.FAT(BytesIO(image), 0, 16, 16), core.fat.FAT(stream, 0, 16, 16)):
+            runs = {entry.name: fat._get_file_runs(entry) for entry in fat.root_dir}
+            assert len(runs['CONTIGUOBIN']) == 1
+            assert len(runs['MULTIRUNBIN']) == 3
+            for name, data in content.items():
+                assert fat.export_file(name) == data
+
+
+def test_read_data_truncated():
+    image, _ = build_fat16_image()
+    fat = core.fat.FAT(BytesIO(image), 0, 16, 16)
+
+    with pytest.raises(core.fat.FATError):
+        fat._read_data(len(image) - 10, 20)
+
+
+def test_save_all(tmp_path):
+    image, content = build_fat16_image()
+    image_path = tmp_path / "fat16.img"
+    image_path.write_bytes(image)
+
+    with open(image_path, 'rb') as stream:
+        # file backed image (kernel copy) and in-memory image (buffered writes)
+        for index, fat in enumerate((core.fat.FAT(stream, 0, 16, 16), core.fat.FAT(BytesIO(image), 0, 16, 16))):
+            out_dir = tmp_path / "out{}".format(index)
+            out_dir.mkdir()
+            fat.save_all(str(out_dir), workers=2)
+
+            assert sorted(os.listdir(out_dir)) == sorted(content)
+            for entry in fat.root_dir:
+                assert (out_dir / entry.name).read_bytes() == fat.export_file(entry) == content[entry.name]
+
+
+def test_wrapped_stream(tmp_path):
+    image, content = build_fat16_image()
+    image_path = tmp_path / "fat16.img.gz"
+    image_path.write_bytes(gzip.compress(image))
+
+    # wrapper stream has fileno() of compressed file, its data must be read through the stream
+    with BufferedReader(gzip.open(image_path, 'rb')) as stream:
+        fat = core.fat.FAT(stream, 0, 16, 16)
+        fat.save_all(str(tmp_path))
+        for name, data in content.items():
+            assert fat.export_file(name) == data
+            assert (tmp_path / name).read_bytes() == data
@@ -23,3 +23,17 @@ def test_parser():
 
     print(gpt.info())
 
+
+def test_equality():
+    with open(DIRECTORY + "mbr_gpt.img", 'rb') as f:
+        data = f.read()
+
+    gpt1 = core.gpt.GPT.parse(data, 512)
+    gpt2 = core.gpt.GPT.parse(data, 512)
+    assert gpt1 == gpt2
+    assert gpt1.header == gpt2.header
+    assert gpt1[0] == gpt2[0]
+
+    gpt2[0].last_lba += 1
+    assert gpt1[0] != gpt2[0]
+    assert gpt1 != gpt2
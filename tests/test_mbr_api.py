@@ -50,3 +50,14 @@ def test_builder():
 
     assert len(mbr) == 1
     assert mbr.export() == data
+
+
+def test_parse_table():
+    with open(DIRECTORY + "mbr_gpt.img", 'rb') as f:
+        data = f.read(core.mbr.MBR.SIZE)
+
+    rows = core.mbr.MBR.parse_table(data)
+    assert len(rows) == core.mbr.MBR.MAX_PARTITIONS
+    assert rows[0][4] == core.mbr.PartitionType.EFI_GPT_PROTECT_MBR
+    assert rows[1][4] == core.mbr.PartitionType.EMPTY
+    assert core.mbr.PartitionEntry.from_row(rows[0]) == core.mbr.MBR.parse(data)[0]
@@ -0,0 +1,72 @@
+# Copyright (c) 2019 Martin Olejar
+#
+# SPDX-License-Identifier: BSD-3-Clause
+# The BSD-3-Clause license for this file can be found in the LICENSE file included with this distribution
+# or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
+
+import os
+import sys
+import pytest
+from imx.img import SegDCD
+from core.segments import uboot as ubx
+from core.segments.base import read_text, FileCache
+from core.segments.csf import CST
+from core.segments.dcd import DatSegDCD
+from core.segments.uboot import DatSegUBX
+
+
+def test_read_text(tmp_path):
+    path = tmp_path / "script.txt"
+    path.write_bytes(b"echo a\r\n\r\necho b\recho c\n")
+
+    assert read_text(str(path)) == "echo a\n\necho b\necho c\n"
+    assert read_text(str(path), FileCache()) == "echo a\n\necho b\necho c\n"
+
+
+def test_dcd_inline_data(tmp_path):
+    dcd_text = "# only comment and NOP command\nNop\n"
+    dcd_seg = DatSegDCD('test', {'data': dcd_text})
+
+    def read_fn(path):
+        raise AssertionError("inline DCD must not read file: {}".format(path))
+
+    dcd_seg.load({}, str(tmp_path), read_fn)
+    assert dcd_seg.data == SegDCD.parse_txt(dcd_text).export()
+    assert len(SegDCD.parse(dcd_seg.data)) == 1
+
+
+def test_ubx_inline_script(tmp_path, monkeypatch):
+    class ScriptImage(object):
+        """ Stand-in for uboot script image, which can't be created with all versions of uboot module """
+        class header(object):
+            image_type = ubx.uboot.EnumImageType.SCRIPT
+
+        def load(self, text):
+            self.text = text
+
+        def export(self):
+            return self.text.encode()
+
+    monkeypatch.setattr(ubx.uboot, 'new_img', lambda **kwargs: ScriptImage())
+    ubx_seg = DatSegUBX('test', {'header': {'image_type': 'script'}, 'data': "echo test\n"})
+
+    def read_fn(path):
+        raise AssertionError("inline script must not read file: {}".format(path))
+
+    ubx_seg.load({}, str(tmp_path), read_fn)
+    assert ubx_seg.data == b"echo test\n"
+
+
+def test_cst_temp_dir(tmp_path):
+    cst_exe = tmp_path / "cst"
+    cst_exe.write_text("#!{}\nprint('CSF Processed successfully')\n".format(sys.executable))
+    cst_exe.chmod(0o755)
+
+    cst = CST(str(cst_exe))
+    with open(cst._csf_txt, 'w') as f:
+        f.write("[Header]\n")
+    tmp_dir = cst.tmp_dir
+
+    proc = cst.start(str(tmp_path / "out.bin"))
+    assert 'successfully' in cst.finish(proc)
+    assert not os.path.exists(tmp_dir)
@@ -0,0 +1,28 @@
+# Copyright (c) 2019 Martin Olejar
+#
+# SPDX-License-Identifier: BSD-3-Clause
+# The BSD-3-Clause license for this file can be found in the LICENSE file included with this distribution
+# or at https://spdx.org/licenses/BSD-3-Clause.html#licenseText
+
+import yaml
+import pytest
+from core.smxfile import SafeCustomLoader
+
+
+SMX_TEXT = """
+Name: test
+_Private: x
+data_segments:
+  Kernel.RAW:
+    Address: 0x80000000
+"""
+
+
+def test_loader():
+    smx_data = yaml.load(SMX_TEXT, Loader=SafeCustomLoader)
+
+    assert smx_data['name'] == 'test'
+    assert smx_data['_Private'] == 'x'
+    assert smx_data['__line__'] == 2
+    assert smx_data['data_segments']['kernel.raw']['address'] == 0x80000000
+    assert smx_data['data_segments']['kernel.raw']['__line__'] == 6